@@ -1,11 +1,36 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import feedparser, yaml, re, hashlib
+import feedparser, yaml, re, hashlib, requests, json, time, os, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import islice
 from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # optionnel : repli sur json (stdlib)
+    orjson = None
 
 ROOT = Path(__file__).resolve().parents[1]
 CONFIG = ROOT / 'config' / 'feeds.yml'
 OUT_JSON = ROOT / 'scripts' / 'news_cache.json'
+FEED_META = ROOT / 'scripts' / 'feed_meta.json'
+
+# -------------------- HTTP / parsing --------------------
+MAX_WORKERS = 32
+# le parsing (feedparser + tagging) est CPU-bound : quelques processus suffisent
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+# workers créés hors du processus principal, qui a alors des threads de
+# téléchargement en plein requests/ssl : pas de fork d'un processus multi-thread
+_MP_CTX = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+HTTP_TIMEOUT = (5, 15)  # (connexion, lecture) en secondes
+
+SESSION = requests.Session()
+SESSION.headers['User-Agent'] = 'chamsin-live/1.0 (+https://live.chamsin.org)'
+SESSION.mount('http://', HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+SESSION.mount('https://', HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
 
 COUNTRY_TAGS = {
     'Iran': ['iran', 'tehran'],
@@ -18,50 +43,214 @@ COUNTRY_TAGS = {
     'Caucase': ['armenia', 'azerbaijan', 'nagorno', 'karabakh', 'nakhchivan', 'yerevan', 'baku']
 }
 
+_WS_RE = re.compile(r'\s+')
+_WNORM_RE = re.compile(r'\W+')
+# paramètres de tracking retirés des URLs (traffic_source=rss chez Al Jazeera, etc.)
+_TRACKING_PARAM_RE = re.compile(r'(?:utm_\w+|traffic_source|xtor|at_\w+|fbclid|gclid)$', re.I)
+
+# Un seul automate pour tous les mots-clés : l'alternance est ordonnée par
+# priorité (ordre de COUNTRY_TAGS), donc à chaque position la première
+# branche qui matche est déjà la plus prioritaire. Préfiltre dans le moteur :
+# on ne tente l'alternance qu'en début de mot commençant par une initiale
+# de mot-clé (évite aussi « oman » dans « woman »).
+_COUNTRY_NAMES = list(COUNTRY_TAGS)
+_COUNTRY_PRIO = {}
+for _i, _keys in enumerate(COUNTRY_TAGS.values()):
+    for _k in _keys:
+        _COUNTRY_PRIO.setdefault(_k, _i)
+_COUNTRY_RE = re.compile(
+    r'\b(?=[' + re.escape(''.join(sorted({k[0] for k in _COUNTRY_PRIO}))) + '])'
+    '(?=(' + '|'.join(re.escape(k) for k in sorted(_COUNTRY_PRIO, key=_COUNTRY_PRIO.get)) + '))'
+)
+
+# Entités : une seule regex pour toutes les variantes, chaque variante étant
+# ramenée à son libellé canonique. Les sigles restent sensibles à la casse
+# (« EU », « IDF » ≠ « eu », « idf »), les noms propres non.
+ENTITY_CANON = {
+    'IAEA': 'IAEA', 'AIEA': 'IAEA', 'E3': 'E3', 'IRGC': 'IRGC', 'PASDARAN': 'IRGC',
+    'HEZBOLLAH': 'HEZBOLLAH', 'HIZBOLLAH': 'HEZBOLLAH', 'HOUTHI': 'HOUTHI', 'HOUTHIS': 'HOUTHI',
+    'OFAC': 'OFAC', 'OFSI': 'OFSI', 'EU': 'EU', 'IDF': 'IDF', 'PKK': 'PKK', 'SDF': 'SDF', 'RSF': 'RSF',
+}
+_ENTITY_RE = re.compile(
+    r'\b(IAEA|AIEA|E3|IRGC|OFAC|OFSI|EU|IDF|PKK|SDF|RSF|(?i:pasdaran|hezbollah|hizbollah|houthis?))\b'
+)
+# un bit par libellé canonique, dans l'ordre alphabétique de sortie
+_ENTITY_LABELS = sorted(set(ENTITY_CANON.values()))
+_ENTITY_BITS = {v: 1 << _ENTITY_LABELS.index(c) for v, c in ENTITY_CANON.items()}
+
+# champs bruts conservés par flux pour rejouer make_item() sur un 304
+_ENTRY_FIELDS = ('title', 'link', 'summary', 'published', 'published_parsed', 'updated_parsed')
+
 def load_cfg():
     with open(CONFIG, 'r', encoding='utf-8') as f:
         return yaml.safe_load(f)
 
+def write_json(path, data, indent=True):
+    if orjson is not None:
+        path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=2 if indent else None), encoding='utf-8')
+
+def load_feed_meta():
+    """{url: {etag, modified, entries}} du run précédent (vide si absent/illisible)."""
+    try:
+        return json.loads(FEED_META.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
 def norm(s):
-    return re.sub(r'\s+', ' ', (s or '').strip())
+    return _WS_RE.sub(' ', (s or '').strip())
+
+def canonical_url(url):
+    url = (url or '').strip()
+    if '?' not in url:
+        return url
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        # lien malformé (« http://[::1?x=1 ») : recopié tel quel, comme avant
+        return url
+    query = '&'.join(p for p in parts.query.split('&')
+                     if p and not _TRACKING_PARAM_RE.match(p.split('=', 1)[0]))
+    return urlunsplit(parts._replace(query=query))
+
+def tag_country(text):
+    """`text` : titre + résumé, déjà en minuscules."""
+    best = None
+    for m in _COUNTRY_RE.finditer(text):
+        p = _COUNTRY_PRIO[m.group(1)]
+        if best is None or p < best:
+            best = p
+            if p == 0:
+                break
+    return 'Autres' if best is None else _COUNTRY_NAMES[best]
 
-def tag_country(title, summary):
-    text = f"{title} {summary}".lower()
-    for country, keys in COUNTRY_TAGS.items():
-        if any(k in text for k in keys):
-            return country
-    return 'Autres'
+def extract_entities(text):
+    mask = 0
+    for m in _ENTITY_RE.findall(text):
+        mask |= _ENTITY_BITS[m.upper()]
+    if not mask:
+        return []
+    return [label for i, label in enumerate(_ENTITY_LABELS) if mask >> i & 1]
+
+def iso_utc(e):
+    """Date UTC ISO (AAAA-MM-JJTHH:MM:SSZ) à partir du struct_time déjà parsé par feedparser."""
+    t = e.get('published_parsed') or e.get('updated_parsed')
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', tuple(t)) if t else ''
 
 def hash_key(url, title):
     return hashlib.md5(f"{url}|{title}".encode()).hexdigest()
 
+def make_item(e):
+    title = norm(e.get('title'))
+    # canonisée une fois ici : le dédoublonnage s'appuie sur cet invariant
+    link = canonical_url(e.get('link'))
+    if not title or not link:
+        return None
+    summary = norm(e.get('summary'))
+    text = f"{title} {summary}"
+    return {
+        'title': title,
+        'link': link,
+        'summary': summary,
+        'published': e.get('published') or '',
+        'published_at': iso_utc(e),
+        'country': tag_country(text.lower()),
+        'entities': extract_entities(text),
+    }
+
+def download_feed(url, meta):
+    """
+    Étape I/O (thread) : GET avec timeout et en-têtes conditionnels ETag/Last-Modified.
+    Renvoie (meta, entries, payload) :
+    - 304 : entries = entrées en cache, payload = None ;
+    - 200 : entries = None, payload = (contenu, en-têtes) à parser ;
+    - échec : entries = [], le flux est ignoré pour ce run.
+    """
+    headers = {}
+    if meta.get('entries') is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('modified'):
+            headers['If-Modified-Since'] = meta['modified']
+    try:
+        resp = SESSION.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+        resp.raise_for_status()
+    except requests.RequestException as exc:
+        print(f"[download_feed] {url} ignoré : {exc}")
+        return meta, [], None
+    if resp.status_code == 304:
+        return meta, meta['entries'], None
+    meta = {'etag': resp.headers.get('ETag'), 'modified': resp.headers.get('Last-Modified')}
+    return meta, None, (resp.content, {k.lower(): v for k, v in resp.headers.items()})
+
+def process_feed(url, entries, payload, per_feed):
+    """
+    Étape CPU (processus) : parse le flux si besoin puis construit les items.
+    Renvoie (entrées brutes à mettre en cache, items).
+    """
+    if payload is not None:
+        content, resp_headers = payload
+        # sanitizer conservé : sans lui, <script>, on*= et style= restent dans les
+        # résumés (cache, prompt) et mangent les 220 caractères de compress_items.
+        # Les liens des résumés ne sont jamais suivis : pas de résolution d'URI.
+        parsed = feedparser.parse(content, response_headers=resp_headers,
+                                  resolve_relative_uris=False).entries
+        # dicts simples (picklables) ; struct_time -> tuple, sérialisable par json comme par orjson
+        entries = [{k: tuple(e[k]) if isinstance(e[k], time.struct_time) else e[k]
+                    for k in _ENTRY_FIELDS if k in e} for e in parsed[:per_feed]]
+    # tous les items d'un flux partagent la même source : calculée une fois
+    source = (urlsplit(url).hostname or '').removeprefix('www.')
+    items = []
+    for e in entries[:per_feed]:
+        it = make_item(e)
+        if it is not None:
+            it['source'] = source
+            items.append(it)
+    return entries, items
+
 def collect():
     cfg = load_cfg()
-    items = []
-    for feed_url in cfg['feeds']:
-        d = feedparser.parse(feed_url)
-        for e in d.entries[: cfg.get('per_feed_max', 20)]:
-            title = norm(getattr(e, 'title', ''))
-            link = getattr(e, 'link', '')
-            summary = norm(getattr(e, 'summary', ''))
-            if not title or not link:
+    feeds = cfg['feeds']
+    per_feed = cfg.get('per_feed_max', 20)
+    old_meta = load_feed_meta()
+    # Pipeline borné : téléchargements en threads (I/O-bound, un worker par flux),
+    # chaque réponse part au parsing dans un petit pool de processus dès son arrivée.
+    workers = min(MAX_WORKERS, max(8, len(feeds)))
+    new_meta = {}
+    parsing = {}
+    with ThreadPoolExecutor(max_workers=workers) as io_pool, \
+         ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=_MP_CTX) as cpu_pool:
+        downloads = {io_pool.submit(download_feed, url, old_meta.get(url, {})): url for url in feeds}
+        for fut in as_completed(downloads):
+            url = downloads[fut]
+            meta, entries, payload = fut.result()
+            new_meta[url] = meta
+            parsing[url] = cpu_pool.submit(process_feed, url, entries, payload, per_feed)
+        # fusion dans l'ordre des flux : dédoublonnage et coupe inchangés
+        uniq = {}
+        for url in feeds:
+            try:
+                entries, items = parsing[url].result()
+            except Exception as exc:
+                # comme un échec de téléchargement : flux ignoré pour ce run,
+                # validateurs et entrées du run précédent conservés
+                print(f"[process_feed] {url} ignoré : {exc}")
+                new_meta[url] = old_meta.get(url, {})
                 continue
-            items.append({
-                'title': title,
-                'link': link,
-                'summary': summary,
-                'published': getattr(e, 'published', ''),
-                'country': tag_country(title, summary),
-                'key': hash_key(link, title)
-            })
-    uniq = {}
-    for it in items:
-        uniq[it['key']] = it
-    kept = list(uniq.values())[: cfg.get('overall_max', 120)]
+            # seul un flux re-parsé remplace les entrées en cache (304/échec : inchangées)
+            new_meta[url].setdefault('entries', entries)
+            for it in items:
+                uniq[(it['link'], _WNORM_RE.sub('', it['title']).lower())] = it
+    write_json(FEED_META, new_meta, indent=False)
+    # pas de copie intégrale avant la coupe : seuls les overall_max premiers sont matérialisés
+    kept = list(islice(uniq.values(), cfg.get('overall_max', 120)))
+    # le hash n'est utile qu'en sortie JSON : calculé pour les seuls items retenus
+    for it in kept:
+        it['key'] = hash_key(it['link'], it['title'])
     return kept
 
 if __name__ == '__main__':
-    import json
     data = collect()
-    OUT_JSON.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+    write_json(OUT_JSON, data)
     print(f"Collected {len(data)} items → {OUT_JSON}")
@@ -13,26 +13,47 @@ Améliorations clés vs. version initiale :
 - Sécurité sur le remplacement dans live.html (marqueurs obligatoires).
 """
 
-import os, json, time, re, html
+import os, json, time, re, html, hashlib, mmap, tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 from pathlib import Path
 import requests
 
+try:
+    import orjson
+except ImportError:  # optionnel : repli sur json (stdlib)
+    orjson = None
+
 # -------------------- Chemins --------------------
 ROOT = Path(__file__).resolve().parents[1]
 CACHE = ROOT / 'scripts' / 'news_cache.json'
 TEMPLATE = ROOT / 'templates' / 'live_template.html'
 LIVE_HTML = ROOT / 'live.html'
+LLM_CACHE_DIR = ROOT / 'scripts' / '.llm_cache'
 
 # -------------------- OpenAI API --------------------
 OPENAI_BASE = os.getenv('OPENAI_BASE', 'https://api.openai.com/v1')
 OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
 OPENAI_KEY = os.getenv('OPENAI_API_KEY', '').strip()
 
+# Cache disque des réponses (clé = hash de la requête complète) ; LLM_CACHE=0 pour l'ignorer
+LLM_CACHE = os.getenv('LLM_CACHE', '1') != '0'
+LLM_CACHE_MAX = 64  # nombre de réponses conservées (les moins récemment utilisées sont purgées)
+
+# Nombre d'appels ITEMS parallèles (par tranches de pays) ; 1 = un seul appel ITEMS+ANALYSIS.
+# Au-delà de 1, l'appel ANALYSIS reçoit encore tous les items : environ deux fois
+# plus de tokens d'entrée, en échange d'une latence bornée par la tranche la plus lente.
+LLM_SHARDS = max(1, int(os.getenv('LLM_SHARDS', '1')))
+
 if not OPENAI_KEY:
     raise RuntimeError("OPENAI_API_KEY manquant dans l'environnement.")
 
+# Session partagée : connexion keep-alive réutilisée entre retries et shards
+_SESSION = requests.Session()
+_SESSION.headers.update({"Authorization": f"Bearer {OPENAI_KEY}", "Content-Type": "application/json"})
+
 # -------------------- Balises & constantes --------------------
 REPLACER_START = "<!-- LIVE:START -->"
 REPLACER_END   = "<!-- LIVE:END -->"
@@ -70,12 +91,28 @@ Consignes :
 - 1–2 phrases factuelles par ligne pays ; pas de spéculation ; pas de chiffres non sourcés dans les items.
 - L’analyse (2–4 <p>) doit dégager les tendances communes (sécurité, diplomatie, humanitaire, sanctions, énergie)."""
 
+# USER_TEMPLATE pré-découpé une fois : à chaque prompt, simple concaténation
+# autour de {date} et {items_json} (pas de re-parsing du format)
+_USER_PRE, _, _USER_REST = USER_TEMPLATE.partition("{date}")
+_USER_MID, _, _USER_SUF = _USER_REST.partition("{items_json}")
+
+# Consignes ajoutées au prompt utilisateur en mode « shards »
+ITEMS_ONLY = "\n- Produire UNIQUEMENT le bloc <!--ITEMS-->…<!--/ITEMS--> pour les pays fournis (l’analyse est rédigée à part)."
+ANALYSIS_ONLY = "\n- Produire UNIQUEMENT le bloc <!--ANALYSIS-->…<!--/ANALYSIS--> (les items sont rédigés à part)."
+
+# -------------------- Regex précompilées --------------------
+_RE_FENCE = re.compile(r"```(?:html)?")
+_RE_SCRIPT_STYLE = re.compile(r"<\s*(script|style)[^>]*>.*?<\s*/\s*\1\s*>", re.I | re.S)
+_RE_ON_ATTR = re.compile(r"""\s(on\w+|style)\s*=\s*(?:"[^"]*"|'[^']*')""", re.I)
+# délimiteurs du prompt, tous repérés en une passe (petites variations d'espaces/casse tolérées)
+_RE_MARKER = re.compile(r"<!--\s*(/?(?:ITEMS|ANALYSIS))\s*-->", re.I)
+
 # -------------------- Utilitaires --------------------
-def read_json(path: Path):
-    return json.loads(path.read_text(encoding='utf-8'))
+# décodage JSON depuis des octets UTF-8, sans str intermédiaire (orjson si disponible)
+_loads = orjson.loads if orjson is not None else json.loads
 
-def iso_today_paris(fmt='%d/%m/%Y'):
-    return datetime.now(PARIS_TZ).strftime(fmt)
+def read_json(path: Path):
+    return _loads(path.read_bytes())
 
 def html_strip_dangerous(s: str) -> str:
     """
@@ -84,31 +121,91 @@ def html_strip_dangerous(s: str) -> str:
     """
     if not s:
         return ""
-    # Enlever fences Markdown
-    s = s.replace("```html", "").replace("```", "")
-    # Supprimer balises script/style
-    s = re.sub(r"(?is)<\s*(script|style)[^>]*>.*?<\s*/\s*\1\s*>", "", s)
-    # Supprimer attributs on* et style
-    s = re.sub(r'(?i)\s(on\w+|style)\s*=\s*"[^"]*"', "", s)
-    s = re.sub(r"(?i)\s(on\w+|style)\s*=\s*'[^']*'", "", s)
-    # Nettoyage espaces
-    s = re.sub(r"\s+", " ", s).strip()
+    # Enlever fences Markdown (```html et ``` en une seule passe)
+    s = _RE_FENCE.sub("", s)
+    # Supprimer balises script/style et attributs on*/style (guillemets doubles
+    # ou simples) jusqu'à point fixe : une suppression peut en recoller une autre
+    # (« <scr<script></script>ipt> »). Sans rien à retirer : une passe chacune.
+    while True:
+        s, n_tags = _RE_SCRIPT_STYLE.subn("", s)
+        s, n_attrs = _RE_ON_ATTR.subn("", s)
+        if not (n_tags or n_attrs):
+            break
+    # Nettoyage espaces (split/join : une passe C, sans regex)
+    s = " ".join(s.split())
     return s
 
+def json_bytes(obj) -> bytes:
+    """JSON UTF-8 compact (orjson si disponible)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def llm_cache_path(body: bytes):
+    if not LLM_CACHE:
+        return None
+    return LLM_CACHE_DIR / f"{hashlib.blake2b(body, digest_size=16).hexdigest()}.txt"
+
+def llm_cache_store(path: Path, content: str):
+    """Écriture atomique (tmp + rename) puis purge LRU au-delà de LLM_CACHE_MAX."""
+    LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(content, encoding='utf-8')
+    os.replace(tmp, path)
+    # purge best-effort : avec des shards concurrents, une autre tranche peut
+    # supprimer une entrée entre glob et stat ; la réponse (payée) prime
+    try:
+        entries = sorted(LLM_CACHE_DIR.glob('*.txt'), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in entries[LLM_CACHE_MAX:]:
+            old.unlink(missing_ok=True)
+    except OSError as exc:
+        print(f"[llm_cache_store] purge ignorée : {exc}")
+
+def read_sse_content(r) -> str:
+    """
+    Lit une réponse chat/completions en streaming (SSE) : une ligne « data: {...} »
+    par fragment, jusqu'à « data: [DONE] ». Concatène les choices[0].delta.content.
+    """
+    parts = []
+    for line in r.iter_lines():
+        if not line.startswith(b"data:"):
+            continue  # lignes vides / commentaires keep-alive
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return "".join(parts)
+        if b'"content"' not in data:
+            continue  # fragments rôle / finish_reason / usage : rien à décoder
+        choices = _loads(data).get('choices')
+        if choices:
+            piece = choices[0].get('delta', {}).get('content')
+            if piece:
+                parts.append(piece)
+    # flux coupé avant [DONE] : réponse tronquée, on ne la met pas en cache
+    raise requests.RequestException("[openai_chat] flux SSE interrompu avant [DONE]")
+
 def openai_chat(messages, temperature=0.2, max_retries=6, timeout=60):
-    headers = {"Authorization": f"Bearer {OPENAI_KEY}", "Content-Type": "application/json"}
-    payload = {"model": OPENAI_MODEL, "messages": messages, "temperature": temperature}
+    # stream : les octets arrivent au fil de la génération (pas d'attente du corps complet)
+    payload = {"model": OPENAI_MODEL, "messages": messages, "temperature": temperature, "stream": True}
+    body = json_bytes(payload)  # sérialisé une fois pour tous les retries
+    cache_path = llm_cache_path(body)
+    if cache_path is not None and cache_path.exists():
+        cache_path.touch()  # LRU : marque l'entrée comme récemment utilisée
+        print(f"[openai_chat] réponse en cache ({cache_path.name})")
+        return cache_path.read_text(encoding='utf-8')
     delay = 2
     for attempt in range(max_retries):
-        r = requests.post(f"{OPENAI_BASE}/chat/completions", headers=headers, json=payload, timeout=timeout)
+        r = _SESSION.post(f"{OPENAI_BASE}/chat/completions", data=body, timeout=timeout, stream=True)
         if r.status_code == 200:
-            j = r.json()
-            content = j['choices'][0]['message']['content']
+            with r:
+                content = read_sse_content(r)
+            if cache_path is not None:
+                llm_cache_store(cache_path, content)
             return content
         if r.status_code in (429, 500, 502, 503, 504):
             retry_after = r.headers.get("Retry-After")
             sleep_s = int(retry_after) if retry_after and retry_after.isdigit() else delay
             print(f"[openai_chat] HTTP {r.status_code}, retry in {sleep_s}s… (attempt {attempt+1}/{max_retries})")
+            r.close()  # corps non lu : rend la connexion au pool avant le retry
             time.sleep(sleep_s)
             delay = min(delay * 2, 60)
             continue
@@ -127,25 +224,41 @@ CANON_COUNTRIES = [
     "Arménie", "Azerbaïdjan", "Géorgie", "Afghanistan", "Turquie",
     "Mer Rouge / Maritime", "Autres"
 ]
+_COUNTRY_IDX = {c: i for i, c in enumerate(CANON_COUNTRIES)}
+
+# mappages souples vers les libellés canoniques
+COUNTRY_ALIASES = {
+    "Israel": "Israël/Palestine",
+    "Israël": "Israël/Palestine",
+    "Palestine": "Israël/Palestine",
+    "West Bank": "Israël/Palestine",
+    "Mer Rouge": "Mer Rouge / Maritime",
+    "Red Sea": "Mer Rouge / Maritime",
+    "Gulf": "Arabie saoudite",  # on évite "Golfe" générique ici ; mieux vaut pays
+    "Golfe": "Arabie saoudite",
+    "UAE": "Émirats arabes unis",
+}
 
 def normalize_country(name: str) -> str:
     if not name:
         return "Autres"
+    # un pays hors liste canonique est conservé tel quel (regroupé après les canoniques)
     n = name.strip()
-    # mappages souples
-    aliases = {
-        "Israel": "Israël/Palestine",
-        "Israël": "Israël/Palestine",
-        "Palestine": "Israël/Palestine",
-        "West Bank": "Israël/Palestine",
-        "Mer Rouge": "Mer Rouge / Maritime",
-        "Red Sea": "Mer Rouge / Maritime",
-        "Gulf": "Arabie saoudite",  # on évite "Golfe" générique ici ; mieux vaut pays
-        "Golfe": "Arabie saoudite",
-        "UAE": "Émirats arabes unis",
-    }
-    n = aliases.get(n, n)
-    return n if n in CANON_COUNTRIES else n
+    return COUNTRY_ALIASES.get(n, n)
+
+@lru_cache(maxsize=4096)
+def paris_ddmm(date_iso: str) -> str:
+    """Date ISO -> 'JJ/MM' à l'heure de Paris ('' si absente/illisible). Mémoïsée : les dates se répètent."""
+    # Chemin rapide pour le format émis par fetch_news (AAAA-MM-JJTHH:MM:SSZ) :
+    # Paris est à UTC+1/+2, donc avant 22h UTC le jour local est le jour UTC.
+    if (len(date_iso) == 20 and date_iso[4] == '-' and date_iso[7] == '-' and date_iso[10] == 'T'
+            and date_iso[19] == 'Z' and date_iso[11:13] < '22'):
+        return f"{date_iso[8:10]}/{date_iso[5:7]}"
+    try:
+        date_dt = datetime.fromisoformat(date_iso.replace('Z', '+00:00')) if date_iso else None
+    except Exception:
+        date_dt = None
+    return date_dt.astimezone(PARIS_TZ).strftime('%d/%m') if date_dt else ''
 
 def compress_items(data, max_items=40, max_sum=220):
     """
@@ -160,14 +273,11 @@ def compress_items(data, max_items=40, max_sum=220):
         country = (x.get('country_guess') or x.get('country') or 'Autres').strip()
         theme = (x.get('theme') or '').strip()
         ents = x.get('entities') or []
-        date_iso = (x.get('published_at') or '').strip()
-        try:
-            date_dt = datetime.fromisoformat(date_iso.replace('Z', '+00:00')) if date_iso else None
-        except Exception:
-            date_dt = None
-        date_short = date_dt.astimezone(PARIS_TZ).strftime('%d/%m') if date_dt else ''
+        date_short = paris_ddmm((x.get('published_at') or '').strip())
         if len(summary) > max_sum:
-            summary = summary[:max_sum].rsplit(' ', 1)[0] + '…'
+            # coupe au dernier espace avant max_sum (rfind : ni liste ni copie intermédiaire)
+            cut = summary.rfind(' ', 0, max_sum)
+            summary = summary[:cut if cut > 0 else max_sum] + '…'
         out.append({
             "title": title,
             "summary": summary,
@@ -178,26 +288,86 @@ def compress_items(data, max_items=40, max_sum=220):
         })
     return out
 
+def _title_shingles(title: str) -> frozenset:
+    t = " ".join(title.lower().split())
+    return frozenset(t[i:i + 4] for i in range(len(t) - 3)) or frozenset([t])
+
+def dedupe_near(items, threshold=0.8):
+    """
+    Retire les quasi-doublons (même dépêche reprise par plusieurs flux) :
+    Jaccard des 4-grammes de caractères du titre >= threshold. Garde la première occurrence.
+    """
+    kept, fps = [], []
+    for it in items:
+        fp = _title_shingles(it.get("title") or "")
+        n = len(fp)
+        dup = False
+        for other in fps:
+            # Jaccard <= min/max des tailles : inutile de calculer l'intersection sinon
+            if min(n, len(other)) < threshold * max(n, len(other)):
+                continue
+            inter = len(fp & other)
+            if inter >= threshold * (n + len(other) - inter):
+                dup = True
+                break
+        if not dup:
+            kept.append(it)
+            fps.append(fp)
+    return kept
+
 def group_by_country(items):
-    by_c = {}
+    # une seule passe : pays canoniques dans des seaux indexés, les autres à part
+    buckets = [[] for _ in CANON_COUNTRIES]
+    extras = {}
     for it in items:
         c = it.get("country") or "Autres"
-        by_c.setdefault(c, []).append(it)
+        idx = _COUNTRY_IDX.get(c)
+        if idx is None:
+            extras.setdefault(c, []).append(it)
+        else:
+            buckets[idx].append(it)
     # tri pays selon l’ordre canonique, puis alpha
-    ordered = []
-    remaining = sorted([c for c in by_c.keys() if c not in CANON_COUNTRIES])
-    for c in CANON_COUNTRIES + remaining:
-        if c in by_c:
-            ordered.append((c, by_c[c]))
+    ordered = [(c, b) for c, b in zip(CANON_COUNTRIES, buckets) if b]
+    ordered.extend(sorted(extras.items()))
     return ordered
 
+def shard_groups(grouped, k):
+    """
+    Découpe les groupes (pays, items) en au plus k tranches contiguës,
+    équilibrées en nombre d'items ; l'ordre canonique des pays est conservé.
+    """
+    total = sum(len(v) for _, v in grouped)
+    shards, cur, n = [], [], 0
+    for i, (c, v) in enumerate(grouped):
+        left = k - 1 - len(shards)  # tranches encore fermables
+        if cur and left:
+            # fermer avant ce groupe si s'arrêter là tombe plus près de la cible
+            # (sinon un gros dernier groupe avale tout), ou s'il ne reste plus
+            # assez de groupes pour remplir les tranches demandées
+            target = total * (len(shards) + 1) / k
+            if abs(n - target) < abs(n + len(v) - target) or len(grouped) - i <= left:
+                shards.append(cur)
+                cur = []
+        cur.append((c, v))
+        n += len(v)
+        if len(shards) < k - 1 and n * k >= total * (len(shards) + 1):
+            shards.append(cur)
+            cur = []
+    if cur:
+        shards.append(cur)
+    return shards
+
 # -------------------- Template & injection --------------------
+_TEMPLATE_READY = False  # vérification faite une seule fois par run
+
 def ensure_template():
     """Crée un template minimal si absent, pour éviter un crash."""
-    if TEMPLATE.exists():
+    global _TEMPLATE_READY
+    if _TEMPLATE_READY:
         return
-    TEMPLATE.parent.mkdir(parents=True, exist_ok=True)
-    TEMPLATE.write_text("""<section class="live">
+    if not TEMPLATE.exists():
+        TEMPLATE.parent.mkdir(parents=True, exist_ok=True)
+        TEMPLATE.write_text("""<section class="live">
 <h1>Chamsin — Live du {{date}}</h1>
 <div class="items">
 {{items}}
@@ -207,59 +377,77 @@ def ensure_template():
 </div>
 </section>
 """, encoding='utf-8')
+    _TEMPLATE_READY = True
 
-def build_html(items_html: str, analysis_html: str) -> str:
+@lru_cache(maxsize=1)
+def _template_fmt() -> str:
+    """
+    Template lu une seule fois et converti en chaîne str.format
+    ({0} = date, {1} = items, {2} = analyse ; accolades littérales échappées).
+    """
+    tpl = TEMPLATE.read_text(encoding='utf-8').replace('{', '{{').replace('}', '}}')
+    return (tpl.replace('{{{{date}}}}', '{0}')
+               .replace('{{{{items}}}}', '{1}')
+               .replace('{{{{analysis}}}}', '{2}'))
+
+def build_html(items_html: str, analysis_html: str, date_dmy: str) -> str:
     ensure_template()
-    today = iso_today_paris('%d/%m/%Y')
-    tpl = TEMPLATE.read_text(encoding='utf-8')
-    return (tpl.replace('{{date}}', today)
-               .replace('{{items}}', items_html.strip())
-               .replace('{{analysis}}', analysis_html.strip()))
+    return _template_fmt().format(date_dmy, items_html.strip(), analysis_html.strip())
 
 def inject_into_live(full_block: str):
+    """
+    Remplace le bloc entre marqueurs sans décoder la page : marqueurs cherchés
+    en octets via mmap, puis préfixe + bloc + suffixe écrits dans un fichier
+    temporaire du même dossier, renommé atomiquement sur live.html.
+    """
     if not LIVE_HTML.exists():
         raise RuntimeError(f"{LIVE_HTML} introuvable.")
-    content = LIVE_HTML.read_text(encoding='utf-8')
-    start = content.find(REPLACER_START)
-    end = content.find(REPLACER_END)
-    if start == -1 or end == -1 or end < start:
-        raise RuntimeError("Marqueurs LIVE:START/END introuvables dans live.html")
-    new = content[: start + len(REPLACER_START)] + "\n" + full_block + "\n" + content[end:]
-    LIVE_HTML.write_text(new, encoding='utf-8')
+    start_tag, end_tag = REPLACER_START.encode('utf-8'), REPLACER_END.encode('utf-8')
+    with open(LIVE_HTML, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:  # mmap refuse un fichier vide
+            raise RuntimeError("Marqueurs LIVE:START/END introuvables dans live.html")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = mm.find(start_tag)
+            end = mm.find(end_tag)
+            if start == -1 or end == -1 or end < start:
+                raise RuntimeError("Marqueurs LIVE:START/END introuvables dans live.html")
+            fd, tmp = tempfile.mkstemp(dir=LIVE_HTML.parent, prefix='.live.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    out.write(mm[: start + len(start_tag)])
+                    out.write(b"\n" + full_block.encode('utf-8') + b"\n")
+                    out.write(mm[end:])
+                os.chmod(tmp, os.stat(LIVE_HTML).st_mode & 0o777)
+                os.replace(tmp, LIVE_HTML)
+            except BaseException:
+                os.unlink(tmp)
+                raise
 
 # -------------------- Parsing réponse modèle --------------------
 def split_items_analysis(html_text: str):
     """
     Sépare proprement via les délimiteurs requis.
     Fallback : tout bascule dans items si les balises manquent.
+    Une seule sanitation (stable, cf. html_strip_dangerous) puis un seul
+    balayage des délimiteurs ; les deux blocs sont de simples tranches.
     """
     txt = html_strip_dangerous(html_text)
-    # tolérer petites variations d'espaces/casse
-    def _find(tag):
-        m = re.search(rf"<!--\s*{tag}\s*-->", txt, flags=re.I)
-        return m.start() if m else -1
-
-    s_items = _find("ITEMS")
-    e_items = _find("/ITEMS")
-    s_ana   = _find("ANALYSIS")
-    e_ana   = _find("/ANALYSIS")
-
-    if s_items != -1 and e_items != -1:
-        items_html = txt[s_items:e_items]
-        # enlever les commentaires eux-mêmes
-        items_html = re.sub(r"<!--\s*ITEMS\s*-->\s*", "", items_html, flags=re.I).strip()
-    else:
+    # première occurrence de chaque délimiteur : (début, fin)
+    pos = {}
+    for m in _RE_MARKER.finditer(txt):
+        pos.setdefault(m.group(1).upper(), m.span())
+
+    def _block(tag):
+        if tag not in pos or "/" + tag not in pos:
+            return None
+        return txt[pos[tag][1]:pos["/" + tag][0]].strip()
+
+    items_html = _block("ITEMS")
+    if items_html is None:
         items_html = txt
-
-    if s_ana != -1 and e_ana != -1:
-        analysis_html = txt[s_ana:e_ana]
-        analysis_html = re.sub(r"<!--\s*ANALYSIS\s*-->\s*", "", analysis_html, flags=re.I).strip()
-    else:
-        # si pas d'analyse, chaîne vide
-        analysis_html = ""
-
-    # seconde sanitation (au cas où)
-    return html_strip_dangerous(items_html), html_strip_dangerous(analysis_html)
+    # si pas d'analyse, chaîne vide
+    analysis_html = _block("ANALYSIS") or ""
+    return items_html, analysis_html
 
 # -------------------- Programme principal --------------------
 def main():
@@ -267,30 +455,51 @@ def main():
         raise RuntimeError(f"{CACHE} introuvable. Lance d'abord fetch_news.py")
 
     raw = read_json(CACHE)
+    ensure_template()  # avant les appels LLM : un seul stat par run
 
     # compression + regroupement
     max_items = int(os.getenv('MAX_ITEMS', '40'))
     max_sum = int(os.getenv('MAX_SUM', '220'))
     compact = compress_items(raw, max_items=max_items, max_sum=max_sum)
+    # quasi-doublons retirés avant le prompt : moins de tokens, même information
+    compact = dedupe_near(compact, threshold=float(os.getenv('DEDUPE_THRESHOLD', '0.8')))
 
     # Option : regrouper par pays côté user prompt pour donner un signal fort
     grouped = group_by_country(compact)
-    # On renvoie une structure compacte au modèle (moins de tokens que du vrac)
-    items_for_llm = [{"country": c, "items": v} for c, v in grouped]
-
-    date_str = datetime.now(PARIS_TZ).strftime('%d/%m')
-    user = USER_TEMPLATE.format(date=date_str, items_json=json.dumps(items_for_llm, ensure_ascii=False))
-
-    content = openai_chat(
-        messages=[{"role": "system", "content": SYSTEM_PROMPT},
-                  {"role": "user", "content": user}],
-        temperature=0.2,
-        max_retries=6,
-        timeout=90
-    )
-
-    items_html, analysis_html = split_items_analysis(content)
-    full_html = build_html(items_html, analysis_html)
+
+    # une seule lecture de l'horloge par run : prompt et page partagent la même date
+    now = datetime.now(PARIS_TZ)
+    date_str = now.strftime('%d/%m')
+
+    def user_prompt(groups, extra=""):
+        # On renvoie une structure compacte au modèle (moins de tokens que du vrac)
+        items_for_llm = [{"country": c, "items": v} for c, v in groups]
+        # JSON compact (orjson si disponible) : plus rapide et moins de tokens
+        items_json = json_bytes(items_for_llm).decode('utf-8')
+        return "".join((_USER_PRE, date_str, _USER_MID, items_json, _USER_SUF, extra))
+
+    def ask(user):
+        return openai_chat(
+            messages=[{"role": "system", "content": SYSTEM_PROMPT},
+                      {"role": "user", "content": user}],
+            temperature=0.2,
+            max_retries=6,
+            timeout=90
+        )
+
+    shards = shard_groups(grouped, LLM_SHARDS)
+    if len(shards) > 1:
+        # appels concurrents (I/O-bound) : un par tranche de pays pour les items,
+        # plus un pour l'analyse sur l'ensemble ; la latence est celle du plus lent
+        prompts = [user_prompt(sh, ITEMS_ONLY) for sh in shards] + [user_prompt(grouped, ANALYSIS_ONLY)]
+        with ThreadPoolExecutor(max_workers=len(prompts)) as pool:
+            contents = list(pool.map(ask, prompts))
+        items_html = "\n".join(split_items_analysis(c)[0] for c in contents[:-1])
+        analysis_html = split_items_analysis(contents[-1])[1]
+    else:
+        items_html, analysis_html = split_items_analysis(ask(user_prompt(grouped)))
+
+    full_html = build_html(items_html, analysis_html, now.strftime('%d/%m/%Y'))
     inject_into_live(full_html)
     print("live.html mis à jour.")
 